@@ -1,4 +1,6 @@
 import os
+import sys
+import atexit
 import re
 import json
 import hmac
@@ -6,24 +8,34 @@ import time
 import base64
 import hashlib
 import logging
+import threading
+import httplib2
+import orjson
 import psycopg2
+from cachetools import TTLCache
 from io import BytesIO
-from psycopg2.extras import DictCursor
-from flask import Flask, request, jsonify, redirect
+from contextlib import contextmanager
+from functools import lru_cache
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extensions import connection as PGConnection
+from flask import Flask, Response, request, jsonify, redirect
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.middleware.proxy_fix import ProxyFix
 import click
 from datetime import datetime, timezone, timedelta
-import jwt
 
 # Google OAuth libs
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.http import MediaIoBaseUpload, MediaInMemoryUpload
 from google.auth.transport.requests import Request as GoogleRequest
 from google.auth.exceptions import RefreshError
+from google_auth_httplib2 import AuthorizedHttp
 
 # ---- logging ----
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -35,12 +47,47 @@ FRONTEND_URL = os.environ.get("FRONTEND_URL", "")
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID", "")
 GOOGLE_CLIENT_SECRET = os.environ.get("GOOGLE_CLIENT_SECRET", "")
 REDIRECT_URI = os.environ.get("REDIRECT_URI", "")
+PG_POOL_MIN = int(os.environ.get("PG_POOL_MIN", "2"))
+PG_POOL_MAX = int(os.environ.get("PG_POOL_MAX", "20"))
+PG_POOL_TIMEOUT = float(os.environ.get("PG_POOL_TIMEOUT", "5"))
+PG_LOCK_TIMEOUT_MS = int(os.environ.get("PG_LOCK_TIMEOUT_MS", "5000"))
+# "off" trades the last few hundred ms of commits on a server crash for cheaper commits
+PG_SYNCHRONOUS_COMMIT = os.environ.get("PG_SYNCHRONOUS_COMMIT", "on")
+PG_KEEPALIVES_IDLE = int(os.environ.get("PG_KEEPALIVES_IDLE", "30"))
+# set to 1 when DATABASE_URL points at PgBouncer in pool_mode=transaction
+PG_TRANSACTION_POOLER = os.environ.get("PG_TRANSACTION_POOLER", "") == "1"
 FLASK_SECRET_KEY = os.environ.get("FLASK_SECRET_KEY", "dev-secret")
 JWT_SECRET = os.environ.get("JWT_SECRET", FLASK_SECRET_KEY)
 JWT_ALGO = "HS256"
 JWT_EXP_DAYS = int(os.environ.get("JWT_EXP_DAYS", "7"))
+JWT_EXP_SECONDS = JWT_EXP_DAYS * 86400
+# hash method is recorded in each stored hash, so changing it only affects new passwords
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+EMAIL_MAX_LENGTH = 254
+PASSWORD_MAX_LENGTH = 1024
+HISTORY_DEFAULT_LIMIT = 50
+HISTORY_MAX_LIMIT = 200
+HISTORY_STREAM_ITERSIZE = 20
+HISTORY_PREVIEW_CHARS = 200
+SAVE_MANY_MAX_NOTES = 1000
+
+class JSONProvider(DefaultJSONProvider):
+    # orjson for jsonify/get_json; its ISO datetimes round-trip as /history cursors
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default), mimetype=self.mimetype)
 
 app = Flask(__name__, static_url_path='', static_folder='static')
+app.json = JSONProvider(app)
+# orjson never sorts keys; keep it off for the stdlib fallback too
+app.json.sort_keys = False
+app.url_map.strict_slashes = False
 app.secret_key = FLASK_SECRET_KEY
 # tell Flask about the external preferred scheme
 app.config['PREFERRED_URL_SCHEME'] = 'https'
@@ -55,24 +102,132 @@ else:
     CORS(app, supports_credentials=True)
 
 # ---------------- DB helpers ----------------
-def get_db_connection():
+# one pool per process, created on first use so forked workers never share sockets
+_pg_pool = None
+_pg_pool_lock = threading.Lock()
+# callers wait up to PG_POOL_TIMEOUT for a free slot instead of getting PoolError
+_pg_pool_slots = threading.BoundedSemaphore(PG_POOL_MAX)
+
+class ConnectionPool(ThreadedConnectionPool):
+    def __init__(self, minconn, maxconn, *args, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        # after startup, minconn is only read as the number of idle connections putconn keeps
+        self.minconn = self.maxconn
+
+class PooledConnection(PGConnection):
+    # remembers which PREPARED_STATEMENTS this server session already knows
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+# Hot fixed-shape statements, parsed and planned once per connection instead of per request.
+PREPARED_STATEMENTS = {
+    "user_by_email": "SELECT id, password_hash FROM users WHERE lower(email) = $1",
+    "email_exists": "SELECT EXISTS (SELECT 1 FROM users WHERE lower(email) = $1)",
+    "user_profile": "SELECT id, email, google_creds_json IS NOT NULL AS drive_linked FROM users WHERE id = $1",
+    "note_by_filename": """
+        SELECT filename, filecontent, title, drive_file_id, updated_at
+        FROM notes WHERE user_id = $1 AND filename = $2
+    """,
+    "note_update": """
+        UPDATE notes SET filecontent = $1, title = $2
+        WHERE filename = $3 AND user_id = $4
+        RETURNING drive_file_id, updated_at,
+            (SELECT google_creds_json IS NOT NULL FROM users WHERE id = $4) AS drive_linked
+    """,
+    "note_insert": """
+        INSERT INTO notes (user_id, filename, filecontent, title)
+        VALUES ($1, $2, $3, $4)
+        RETURNING updated_at,
+            (SELECT google_creds_json IS NOT NULL FROM users WHERE id = $1) AS drive_linked
+    """,
+    # changes whenever a note is added, edited, synced (the trigger bumps updated_at) or deleted
+    "notes_version": "SELECT count(*) || ':' || coalesce(max(updated_at)::text, '') FROM notes WHERE user_id = $1",
+    # deletes and, only if any deleted note had a Drive copy, returns the creds to remove it with
+    "notes_delete": """
+        WITH d AS (
+            DELETE FROM notes WHERE user_id = $1 AND filename = ANY($2::text[]) RETURNING drive_file_id
+        )
+        SELECT array_remove(array_agg(drive_file_id), NULL),
+               CASE WHEN bool_or(drive_file_id IS NOT NULL)
+                    THEN (SELECT google_creds_json FROM users WHERE id = $1) END
+        FROM d
+    """,
+    "notes_drive_sync": """
+        SELECT n.filename, n.drive_file_id, u.google_creds_json
+        FROM notes n JOIN users u ON u.id = n.user_id
+        WHERE n.user_id = $1 AND n.filename = ANY($2::text[])
+    """,
+}
+
+# the same statements with %s placeholders, for when server-side PREPARE is unavailable
+UNPREPARED_STATEMENTS = {name: re.sub(r"\$\d+", "%s", sql) for name, sql in PREPARED_STATEMENTS.items()}
+
+def execute_prepared(cur, name, params):
+    if PG_TRANSACTION_POOLER:
+        cur.execute(UNPREPARED_STATEMENTS[name], params)
+        return
+    conn = cur.connection
+    if name not in conn.prepared:
+        cur.execute(f"PREPARE {name} AS {PREPARED_STATEMENTS[name]}")
+        conn.prepared.add(name)
+    cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+
+def get_db_pool():
+    global _pg_pool
+    if _pg_pool is None:
+        with _pg_pool_lock:
+            if _pg_pool is None:
+                # session options once per connection (not behind PgBouncer), plus TCP keepalives
+                kwargs = {"connection_factory": PooledConnection, "keepalives": 1,
+                          "keepalives_idle": PG_KEEPALIVES_IDLE, "keepalives_interval": 10, "keepalives_count": 3}
+                if not PG_TRANSACTION_POOLER:
+                    kwargs["options"] = f"-c lock_timeout={PG_LOCK_TIMEOUT_MS} -c synchronous_commit={PG_SYNCHRONOUS_COMMIT}"
+                _pg_pool = ConnectionPool(PG_POOL_MIN, PG_POOL_MAX, dsn=DATABASE_URL, **kwargs)
+    return _pg_pool
+
+@atexit.register
+def close_db_pool():
+    if _pg_pool is not None:
+        _pg_pool.closeall()
+
+def get_db_connection(autocommit=False):
+    # read-only handlers pass autocommit=True to skip the BEGIN/ROLLBACK round trips
+    if not DATABASE_URL:
+        logging.error("DATABASE_URL not configured")
+        return None
+    if not _pg_pool_slots.acquire(timeout=PG_POOL_TIMEOUT):
+        logging.error("DB connection failed: pool exhausted")
+        return None
     try:
-        if not DATABASE_URL:
-            logging.error("DATABASE_URL not configured")
-            return None
-        conn = psycopg2.connect(DATABASE_URL)
+        conn = get_db_pool().getconn()
+        if autocommit:
+            conn.autocommit = True
         return conn
     except Exception as e:
+        _pg_pool_slots.release()
         logging.error(f"DB connection failed: {e}")
         return None
 
+def release_db_connection(conn):
+    # putconn rolls back anything left open and drops connections the server has closed
+    try:
+        if conn.autocommit and not conn.closed:
+            conn.autocommit = False
+        get_db_pool().putconn(conn)
+    except Exception:
+        logging.exception("Returning DB connection to pool failed")
+        conn.close()
+    finally:
+        _pg_pool_slots.release()
+
 def init_db():
     conn = get_db_connection()
     if not conn:
-        logging.error("Cannot initialize DB: no connection")
-        return
+        raise RuntimeError("Cannot initialize DB: no connection")
     try:
         with conn.cursor() as cur:
+            # one round trip; each step checks the catalog first so re-runs take no locks
             cur.execute("""
             CREATE TABLE IF NOT EXISTS users (
                 id SERIAL PRIMARY KEY,
@@ -80,8 +235,6 @@ def init_db():
                 password_hash TEXT NOT NULL,
                 google_creds_json TEXT
             );
-            """)
-            cur.execute("""
             CREATE TABLE IF NOT EXISTS notes (
                 id SERIAL PRIMARY KEY,
                 user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
@@ -92,8 +245,22 @@ def init_db():
                 created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
             );
-            """)
-            cur.execute("""
+            -- CREATE INDEX IF NOT EXISTS locks the table before checking the name
+            DO $$
+            BEGIN
+              IF to_regclass('users_email_lower_idx') IS NULL THEN
+                CREATE INDEX users_email_lower_idx ON users (lower(email));
+              END IF;
+              IF to_regclass('notes_user_filename_idx') IS NULL THEN
+                CREATE INDEX notes_user_filename_idx ON notes (user_id, filename);
+              END IF;
+              -- matches /history's ORDER BY exactly, filename breaking ties between notes saved together
+              IF to_regclass('notes_user_updated_filename_idx') IS NULL THEN
+                CREATE INDEX notes_user_updated_filename_idx ON notes (user_id, updated_at DESC, filename);
+              END IF;
+            END
+            $$;
+            DROP INDEX IF EXISTS notes_user_updated_idx;
             CREATE OR REPLACE FUNCTION trigger_set_timestamp()
             RETURNS TRIGGER AS $$
             BEGIN
@@ -101,56 +268,161 @@ def init_db():
               RETURN NEW;
             END;
             $$ LANGUAGE plpgsql;
-            """)
-            cur.execute("DROP TRIGGER IF EXISTS set_timestamp ON notes;")
-            cur.execute("""
-            CREATE TRIGGER set_timestamp
-            BEFORE UPDATE ON notes
-            FOR EACH ROW
-            EXECUTE PROCEDURE trigger_set_timestamp();
+            -- only edits bump updated_at; an old trigger without a column list is replaced
+            DO $$
+            DECLARE
+              cols int2[];
+            BEGIN
+              SELECT tgattr::int2[] INTO cols FROM pg_trigger
+              WHERE tgrelid = 'notes'::regclass AND tgname = 'set_timestamp';
+              IF cols IS NULL OR cardinality(cols) = 0 THEN
+                DROP TRIGGER IF EXISTS set_timestamp ON notes;
+                CREATE TRIGGER set_timestamp
+                BEFORE UPDATE OF filecontent, title ON notes
+                FOR EACH ROW
+                EXECUTE PROCEDURE trigger_set_timestamp();
+              END IF;
+            END
+            $$;
+            -- lz4 TOAST compression where the server supports it; the ALTER only runs once
+            DO $$
+            BEGIN
+              IF 'lz4' = ANY (SELECT unnest(enumvals) FROM pg_settings WHERE name = 'default_toast_compression') THEN
+                IF (SELECT attcompression FROM pg_attribute
+                    WHERE attrelid = 'notes'::regclass AND attname = 'filecontent') IS DISTINCT FROM 'l' THEN
+                  EXECUTE 'ALTER TABLE notes ALTER COLUMN filecontent SET COMPRESSION lz4';
+                END IF;
+              END IF;
+            EXCEPTION WHEN OTHERS THEN
+              RAISE WARNING 'lz4 compression for notes.filecontent not enabled: %', SQLERRM;
+            END
+            $$;
             """)
         conn.commit()
+        # "already exists, skipping" NOTICEs are expected on every run; only surface WARNINGs
+        for notice in conn.notices:
+            if notice.startswith("WARNING"):
+                logging.warning(notice.strip())
+        del conn.notices[:]
         logging.info("DB initialized / migrations applied")
     except Exception:
         logging.exception("Error init DB")
+        raise
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 @app.cli.command("init-db")
 def init_db_command():
-    init_db()
+    try:
+        init_db()
+    except Exception as e:
+        # a non-zero exit lets deploy hooks see that the schema wasn't applied
+        raise click.ClickException(f"DB init failed: {e}")
     click.echo("Initialized DB.")
 
+# ---------------- Validation ----------------
+def is_valid_email(email):
+    # same rule as the old [^@]+@[^@]+\.[^@]+ regex, without backtracking
+    local, _, rest = email.partition("@")
+    domain = rest.split("@", 1)[0]
+    return bool(local) and "." in domain[1:-1]
+
+# ---------------- Password hashing ----------------
+# scrypt/pbkdf2 are deliberately slow and run in C without the GIL. Under gevent workers
+# they would still stall every greenlet in the process, so there they go to gevent's
+# pool of real OS threads; with other workers this is a plain call.
+def run_off_hub(fn, *args):
+    if "gevent" in sys.modules:
+        from gevent import get_hub, monkey
+        if monkey.is_module_patched("threading"):
+            return get_hub().threadpool.apply(fn, args)
+    return fn(*args)
+
+def hash_password(password):
+    return run_off_hub(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+def verify_password(password_hash, password):
+    return run_off_hub(check_password_hash, password_hash, password)
+
+# verified against for unknown login emails; built per worker in gunicorn's post_worker_init
+_dummy_password_hash = None
+
+def get_dummy_password_hash():
+    global _dummy_password_hash
+    if _dummy_password_hash is None:
+        _dummy_password_hash = hash_password(os.urandom(16).hex())
+    return _dummy_password_hash
+
 # ---------------- JWT helpers ----------------
+# HS256 only, so the header and key never change: encode them once and sign with hmac directly.
+# The header bytes match what PyJWT emits, so tokens issued before this stay valid.
+def b64url_encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=")
+
+def b64url_decode(data):
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+JWT_HEADER_B64 = b64url_encode(json.dumps({"alg": JWT_ALGO, "typ": "JWT"}, separators=(",", ":")).encode())
+JWT_KEY = JWT_SECRET.encode()
+
 def create_token(user_id):
-    payload = {"sub": str(user_id), "iat": datetime.utcnow(), "exp": datetime.utcnow() + timedelta(days=JWT_EXP_DAYS)}
-    token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGO)
-    if isinstance(token, bytes):
-        token = token.decode()
-    return token
+    now = int(time.time())
+    payload = {"sub": str(user_id), "iat": now, "exp": now + JWT_EXP_SECONDS}
+    signing_input = JWT_HEADER_B64 + b"." + b64url_encode(orjson.dumps(payload))
+    sig = hmac.new(JWT_KEY, signing_input, hashlib.sha256).digest()
+    return (signing_input + b"." + b64url_encode(sig)).decode()
 
-def decode_token(token):
+def verify_token(token):
+    # returns the verified, unexpired payload or None
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGO])
-        return payload.get("sub")
-    except jwt.ExpiredSignatureError:
-        return None
+        signing_input, _, sig_b64 = token.encode().rpartition(b".")
+        header_b64, _, payload_b64 = signing_input.partition(b".")
+        if not hmac.compare_digest(header_b64, JWT_HEADER_B64):
+            return None
+        # exp is checked before the HMAC; nothing in the payload is trusted until the signature matches
+        payload = orjson.loads(b64url_decode(payload_b64))
+        exp = payload.get("exp") if isinstance(payload, dict) else None
+        if not isinstance(exp, (int, float)) or exp <= time.time():
+            return None
+        expected = hmac.new(JWT_KEY, signing_input, hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, b64url_decode(sig_b64)):
+            logging.warning("JWT signature mismatch")
+            return None
+        return payload
     except Exception:
         logging.exception("JWT decode error")
         return None
 
+def decode_token(token):
+    payload = verify_token(token)
+    return payload.get("sub") if payload else None
+
+# verified tokens, token -> (user_id, exp)
+TOKEN_CACHE_TTL_SECONDS = 60
+_token_cache = TTLCache(maxsize=4096, ttl=TOKEN_CACHE_TTL_SECONDS)
+_token_cache_lock = threading.Lock()
+
 def get_user_id_from_request(req):
     auth = req.headers.get("Authorization", "")
-    if auth.startswith("Bearer "):
-        token = auth.split(" ", 1)[1]
-        user_sub = decode_token(token)
-        if not user_sub:
-            return None
-        try:
-            return int(user_sub)
-        except Exception:
-            return user_sub
-    return None
+    if not auth.startswith("Bearer "):
+        return None
+    token = auth.split(" ", 1)[1]
+    with _token_cache_lock:
+        cached = _token_cache.get(token)
+    if cached:
+        user_id, exp = cached
+        return user_id if exp > time.time() else None
+    payload = verify_token(token)
+    user_sub = payload.get("sub") if payload else None
+    if not user_sub:
+        return None
+    try:
+        user_id = int(user_sub)
+    except Exception:
+        user_id = user_sub
+    with _token_cache_lock:
+        _token_cache[token] = (user_id, payload["exp"])
+    return user_id
 
 # ---------------- secure state helpers ----------------
 STATE_TTL_SECONDS = 600
@@ -182,15 +454,77 @@ def verify_oauth_state(state_b64, max_age_seconds=STATE_TTL_SECONDS):
         return None
 
 # ---------------- Google Drive helpers ----------------
-def build_client_config():
-    return {
-        "web": {
-            "client_id": GOOGLE_CLIENT_ID,
-            "client_secret": GOOGLE_CLIENT_SECRET,
-            "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-            "token_uri": "https://oauth2.googleapis.com/token",
-        }
+DRIVE_RESUMABLE_THRESHOLD = 5 * 1024 * 1024
+DRIVE_CHUNK_SIZE = 1024 * 1024
+DRIVE_BATCH_LIMIT = 100
+DRIVE_SERVICE_CACHE_TTL_SECONDS = 3600
+# idle DriveClients kept for reuse
+DRIVE_CLIENT_POOL_MAX = int(os.environ.get("DRIVE_CLIENT_POOL_MAX", str(PG_POOL_MAX)))
+DRIVE_CLIENT_IDLE_SECONDS = 300
+
+# httplib2.Http isn't thread-safe: each client pairs one keep-alive Http with the services built on it
+class DriveClient:
+    def __init__(self):
+        self.http = httplib2.Http(timeout=30)
+        self.services = TTLCache(maxsize=256, ttl=DRIVE_SERVICE_CACHE_TTL_SECONDS)
+
+    def close(self):
+        self.services.clear()
+        self.http.close()
+
+# idle clients as (client, returned_at), most recently used last
+_drive_clients = []
+_drive_clients_lock = threading.Lock()
+
+@contextmanager
+def drive_client():
+    with _drive_clients_lock:
+        client = _drive_clients.pop()[0] if _drive_clients else None
+    if client is None:
+        client = DriveClient()
+    try:
+        yield client
+    finally:
+        now = time.monotonic()
+        with _drive_clients_lock:
+            stale = 0
+            while stale < len(_drive_clients) and now - _drive_clients[stale][1] > DRIVE_CLIENT_IDLE_SECONDS:
+                stale += 1
+            dropped = [c for c, _ in _drive_clients[:stale]]
+            del _drive_clients[:stale]
+            if len(_drive_clients) < DRIVE_CLIENT_POOL_MAX:
+                _drive_clients.append((client, now))
+            else:
+                dropped.append(client)
+        for c in dropped:
+            c.close()
+
+# the Drive v3 discovery document ships with googleapiclient; read it from disk once per process
+_drive_discovery_doc = None
+
+def get_drive_discovery_doc():
+    global _drive_discovery_doc
+    if _drive_discovery_doc is None:
+        _drive_discovery_doc = get_static_doc("drive", "v3")
+    return _drive_discovery_doc
+
+# Google may return a superset of the requested scopes (include_granted_scopes)
+os.environ['OAUTHLIB_RELAX_TOKEN_SCOPE'] = '1'
+
+# client config and scopes only depend on env vars, so build them once at import
+GOOGLE_CLIENT_CONFIG = {
+    "web": {
+        "client_id": GOOGLE_CLIENT_ID,
+        "client_secret": GOOGLE_CLIENT_SECRET,
+        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+        "token_uri": "https://oauth2.googleapis.com/token",
     }
+}
+GOOGLE_SCOPES = ("https://www.googleapis.com/auth/drive.file", "openid", "email", "profile")
+
+def make_flow(redirect_uri, state=None):
+    # Flow holds per-exchange state (oauth session, fetched token), so it is not shared
+    return Flow.from_client_config(GOOGLE_CLIENT_CONFIG, scopes=GOOGLE_SCOPES, redirect_uri=redirect_uri, state=state)
 
 def effective_redirect_uri():
     if REDIRECT_URI:
@@ -199,11 +533,13 @@ def effective_redirect_uri():
         return BACKEND_URL.rstrip("/") + "/auth/google/callback"
     return (request.url_root.rstrip("/") + "auth/google/callback") if request else "/auth/google/callback"
 
-def get_drive_service_from_creds_json(creds_json):
+def get_drive_service_from_creds_json(creds_json, http):
+    # returns (service, creds, refreshed); refreshed is True only when the access token was renewed here
     if not creds_json:
-        return None, None
+        return None, None, False
     try:
-        creds_info = json.loads(creds_json)
+        creds_info = orjson.loads(creds_json)
+        expiry = creds_info.get("expiry")
         creds = Credentials(
             token=creds_info.get("token"),
             refresh_token=creds_info.get("refresh_token"),
@@ -211,35 +547,73 @@ def get_drive_service_from_creds_json(creds_json):
             client_id=creds_info.get("client_id"),
             client_secret=creds_info.get("client_secret"),
             scopes=creds_info.get("scopes"),
+            expiry=datetime.fromisoformat(expiry) if expiry else None,
         )
+        refreshed = False
         if creds.expired and creds.refresh_token:
             try:
                 creds.refresh(GoogleRequest())
+                refreshed = True
             except RefreshError:
                 logging.exception("Failed to refresh Google credentials")
-                return None, None
-        service = build("drive", "v3", credentials=creds)
-        return service, creds
+                return None, None, False
+        authed_http = AuthorizedHttp(creds, http=http)
+        service = build_from_document(get_drive_discovery_doc(), http=authed_http)
+        return service, creds, refreshed
     except Exception:
         logging.exception("Error building drive service from creds")
-        return None, None
+        return None, None, False
+
+def save_user_creds(cur, user_id, creds, client=None):
+    creds_json = creds_to_json(creds)
+    cur.execute("UPDATE users SET google_creds_json = %s WHERE id = %s", (creds_json, user_id))
+    # a service built on these creds stays valid; re-key it so the next lookup doesn't rebuild it
+    cached = client.services.get(str(user_id)) if client else None
+    if cached and cached[2] is creds:
+        client.services[str(user_id)] = (creds_json, cached[1], creds)
+
+# cached services are reused while built from the current creds JSON and not about to expire
+DRIVE_TOKEN_MIN_REMAINING = timedelta(seconds=60)
+
+def get_drive_service_for_user(client, user_id, creds_json):
+    # returns (service, creds, refreshed) like get_drive_service_from_creds_json
+    if not creds_json:
+        return None, None, False
+    services = client.services
+    cached = services.get(str(user_id))
+    if cached and cached[0] == creds_json:
+        _, service, creds = cached
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        if creds.expiry is None or creds.expiry - now > DRIVE_TOKEN_MIN_REMAINING:
+            return service, creds, False
+    service, creds, refreshed = get_drive_service_from_creds_json(creds_json, client.http)
+    if service:
+        services[str(user_id)] = (creds_json, service, creds)
+    else:
+        services.pop(str(user_id), None)
+    return service, creds, refreshed
 
 def creds_to_json(creds):
-    return json.dumps({
+    return orjson.dumps({
         "token": creds.token,
         "refresh_token": getattr(creds, "refresh_token", None),
         "token_uri": creds.token_uri,
         "client_id": creds.client_id,
         "client_secret": creds.client_secret,
-        "scopes": creds.scopes
-    })
+        "scopes": creds.scopes,
+        # google-auth keeps expiry as naive UTC; without it creds.expired is always False
+        "expiry": creds.expiry.isoformat() if creds.expiry else None
+    }).decode()
 
 def upload_or_update_file(service, file_name, content, existing_file_id=None):
     try:
-        fh = BytesIO(content.encode("utf-8"))
-        media = MediaIoBaseUpload(fh, mimetype="text/plain", resumable=False)
+        data = content.encode("utf-8")
+        if len(data) > DRIVE_RESUMABLE_THRESHOLD:
+            media = MediaIoBaseUpload(BytesIO(data), mimetype="text/plain", chunksize=DRIVE_CHUNK_SIZE, resumable=True)
+        else:
+            media = MediaInMemoryUpload(data, mimetype="text/plain", resumable=False)
         if existing_file_id:
-            updated = service.files().update(fileId=existing_file_id, media_body=media).execute()
+            updated = service.files().update(fileId=existing_file_id, media_body=media, fields="id").execute()
             return updated.get("id")
         else:
             meta = {"name": file_name, "mimeType": "text/plain"}
@@ -249,13 +623,122 @@ def upload_or_update_file(service, file_name, content, existing_file_id=None):
         logging.exception("Drive upload/update failed")
         return None
 
-def delete_drive_file(service, file_id):
+def delete_drive_files(service, file_ids):
+    # one multipart batch request per DRIVE_BATCH_LIMIT deletes instead of a round trip each
+    deleted = 0
+    def on_delete(request_id, response, exception):
+        nonlocal deleted
+        if exception is not None:
+            logging.error(f"Drive delete failed: {exception}")
+        else:
+            deleted += 1
+    for start in range(0, len(file_ids), DRIVE_BATCH_LIMIT):
+        batch = service.new_batch_http_request(callback=on_delete)
+        for file_id in file_ids[start:start + DRIVE_BATCH_LIMIT]:
+            batch.add(service.files().delete(fileId=file_id))
+        try:
+            batch.execute()
+        except Exception:
+            logging.exception("Drive batch delete failed")
+    return deleted
+
+# ---------------- background Drive sync ----------------
+# /save commits the note and returns; Drive uploads happen on a per-process daemon thread.
+# Pending uploads are keyed by (user_id, filename), so repeated saves of one note
+# before the worker gets to it collapse into a single upload of the latest content.
+_drive_pending = {}
+_drive_pending_cond = threading.Condition()
+_drive_worker = None
+
+def enqueue_drive_upload(user_id, filename, content):
+    global _drive_worker
+    with _drive_pending_cond:
+        _drive_pending[(user_id, filename)] = content
+        if _drive_worker is None or not _drive_worker.is_alive():
+            _drive_worker = threading.Thread(target=drive_upload_worker, name="drive-upload", daemon=True)
+            _drive_worker.start()
+        _drive_pending_cond.notify()
+
+def drive_upload_worker():
+    while True:
+        with _drive_pending_cond:
+            while not _drive_pending:
+                _drive_pending_cond.wait()
+            # take every pending note of the oldest queued user so they share one sync pass
+            user_id = next(iter(_drive_pending))[0]
+            notes = {filename: _drive_pending.pop((uid, filename))
+                     for uid, filename in list(_drive_pending) if uid == user_id}
+        try:
+            sync_notes_to_drive(user_id, notes)
+        except Exception:
+            logging.exception(f"Background Drive upload failed for user {user_id}")
+
+def sync_notes_to_drive(user_id, notes):
+    # notes: {filename: content}; no pooled connection is held during the uploads
+    conn = get_db_connection(autocommit=True)
+    if not conn:
+        logging.error("DB connection failed during background Drive upload")
+        return
     try:
-        service.files().delete(fileId=file_id).execute()
-        return True
-    except Exception:
-        logging.exception("Drive delete failed")
-        return False
+        with conn.cursor() as cur:
+            # re-read at upload time: notes may have been deleted or synced meanwhile
+            execute_prepared(cur, "notes_drive_sync", (user_id, list(notes)))
+            rows = cur.fetchall()
+    finally:
+        release_db_connection(conn)
+    if not rows:
+        return
+    new_ids = []
+    with drive_client() as client:
+        service, drive_creds, refreshed = get_drive_service_for_user(client, user_id, rows[0][2])
+        if not service:
+            return
+        token = drive_creds.token
+        for filename, existing_drive_id, _ in rows:
+            drive_file_id = upload_or_update_file(service, filename, notes[filename], existing_file_id=existing_drive_id)
+            if drive_file_id and drive_file_id != existing_drive_id:
+                new_ids.append((drive_file_id, filename))
+        # AuthorizedHttp refreshes and retries by itself on a 401; keep the token it got
+        creds_changed = refreshed or drive_creds.token != token
+        if not new_ids and not creds_changed:
+            return
+        conn = get_db_connection()
+        if not conn:
+            logging.error("DB connection failed while recording Drive upload results")
+            return
+        try:
+            with conn.cursor() as cur:
+                if creds_changed:
+                    save_user_creds(cur, user_id, drive_creds, client)
+                if new_ids:
+                    cur.execute("""
+                        UPDATE notes SET drive_file_id = v.drive_file_id
+                        FROM unnest(%s::text[], %s::text[]) AS v(drive_file_id, filename)
+                        WHERE notes.user_id = %s AND notes.filename = v.filename
+                    """, ([i for i, _ in new_ids], [f for _, f in new_ids], user_id))
+            conn.commit()
+        finally:
+            release_db_connection(conn)
+
+def delete_notes_from_drive(user_id, drive_ids, creds_json):
+    with drive_client() as client:
+        service, drive_creds, refreshed = get_drive_service_for_user(client, user_id, creds_json)
+        if not service:
+            return
+        token = drive_creds.token
+        delete_drive_files(service, drive_ids)
+        if not refreshed and drive_creds.token == token:
+            return
+        conn = get_db_connection()
+        if not conn:
+            logging.error("DB connection failed while saving refreshed Drive credentials")
+            return
+        try:
+            with conn.cursor() as cur:
+                save_user_creds(cur, user_id, drive_creds, client)
+            conn.commit()
+        finally:
+            release_db_connection(conn)
 
 # ---------------- Auth routes (register/login/me) ----------------
 @app.route("/register", methods=["POST"])
@@ -263,16 +746,39 @@ def register():
     data = request.get_json() or {}
     email = (data.get("email") or "").strip().lower()
     password = (data.get("password") or "").strip()
-    if not email or not password or not re.match(r"[^@]+@[^@]+\.[^@]+", email):
+    if (not email or not password or len(email) > EMAIL_MAX_LENGTH
+            or len(password) > PASSWORD_MAX_LENGTH or not is_valid_email(email)):
         return jsonify({"error": "Invalid email or password"}), 400
-    hashed = generate_password_hash(password)
+    # cheap duplicate check first so a taken email never pays for the password hash
+    conn = get_db_connection(autocommit=True)
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+    try:
+        with conn.cursor() as cur:
+            execute_prepared(cur, "email_exists", (email,))
+            exists = cur.fetchone()[0]
+    except Exception:
+        logging.exception("Register error")
+        return jsonify({"error": "Internal error"}), 500
+    finally:
+        release_db_connection(conn)
+    if exists:
+        return jsonify({"error": "Email already registered"}), 409
+    # like /login, the slow hash runs with no connection held
+    hashed = hash_password(password)
     conn = get_db_connection()
     if not conn:
         return jsonify({"error": "Database connection failed"}), 500
     try:
         with conn.cursor() as cur:
-            cur.execute("INSERT INTO users (email, password_hash) VALUES (%s, %s) RETURNING id", (email, hashed))
-            new_id = cur.fetchone()[0]
+            cur.execute("""
+                INSERT INTO users (email, password_hash) VALUES (%s, %s)
+                ON CONFLICT (email) DO NOTHING RETURNING id
+            """, (email, hashed))
+            row = cur.fetchone()
+            if not row:
+                return jsonify({"error": "Email already registered"}), 409
+            new_id = row[0]
         conn.commit()
         token = create_token(new_id)
         return jsonify({"message": "User created", "token": token}), 201
@@ -282,50 +788,61 @@ def register():
         logging.exception("Register error")
         return jsonify({"error": "Internal error"}), 500
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 @app.route("/login", methods=["POST"])
 def login():
     data = request.get_json() or {}
     email = (data.get("email") or "").strip().lower()
     password = (data.get("password") or "").strip()
-    conn = get_db_connection()
+    # input no account can match is turned away before it costs a connection, a query and a hash
+    if (not email or not password or "@" not in email
+            or len(email) > EMAIL_MAX_LENGTH or len(password) > PASSWORD_MAX_LENGTH):
+        return jsonify({"error": "Invalid credentials"}), 401
+    conn = get_db_connection(autocommit=True)
     if not conn:
         return jsonify({"error": "Database connection failed"}), 500
     try:
-        with conn.cursor(cursor_factory=DictCursor) as cur:
-            cur.execute("SELECT id, password_hash FROM users WHERE email = %s", (email,))
+        with conn.cursor() as cur:
+            execute_prepared(cur, "user_by_email", (email,))
             user = cur.fetchone()
-        if user and user["password_hash"] and check_password_hash(user["password_hash"], password):
-            token = create_token(user["id"])
-            return jsonify({"token": token, "message": "Login successful"}), 200
-        return jsonify({"error": "Invalid credentials"}), 401
     except Exception:
         logging.exception("Login error")
         return jsonify({"error": "Internal error"}), 500
     finally:
-        conn.close()
+        release_db_connection(conn)
+    # the hash runs with no connection held; unknown emails pay for one too
+    if user is None:
+        verify_password(get_dummy_password_hash(), password)
+        valid = False
+    else:
+        # password_hash is NOT NULL in the schema; a row without one can never match
+        valid = bool(user[1]) and verify_password(user[1], password)
+    if valid:
+        token = create_token(user[0])
+        return jsonify({"token": token, "message": "Login successful"}), 200
+    return jsonify({"error": "Invalid credentials"}), 401
 
 @app.route("/me", methods=["GET"])
 def me():
     user_id = get_user_id_from_request(request)
     if not user_id:
         return jsonify({"error": "Authorization required"}), 401
-    conn = get_db_connection()
+    conn = get_db_connection(autocommit=True)
     if not conn:
         return jsonify({"error": "Database connection failed"}), 500
     try:
-        with conn.cursor(cursor_factory=DictCursor) as cur:
-            cur.execute("SELECT id, email, google_creds_json IS NOT NULL AS drive_linked FROM users WHERE id = %s", (user_id,))
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            execute_prepared(cur, "user_profile", (user_id,))
             row = cur.fetchone()
             if not row:
                 return jsonify({"error": "User not found"}), 404
-            return jsonify({"id": row["id"], "email": row["email"], "drive_linked": row["drive_linked"]}), 200
+            return jsonify(row), 200
     except Exception:
         logging.exception("/me error")
         return jsonify({"error": "Internal error"}), 500
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 # ---------------- Google OAuth endpoints ----------------
 @app.route("/auth/google/start", methods=["GET"])
@@ -341,11 +858,7 @@ def google_auth_start():
     redirect_uri = effective_redirect_uri()
     logging.info(f"google_auth_start redirect_uri={redirect_uri} user={user_id}")
 
-    flow = Flow.from_client_config(
-        build_client_config(),
-        scopes=["https://www.googleapis.com/auth/drive.file", "openid", "email", "profile"],
-        redirect_uri=redirect_uri
-    )
+    flow = make_flow(redirect_uri)
 
     auth_url, _ = flow.authorization_url(access_type="offline", include_granted_scopes="true", prompt="consent", state=state)
     return jsonify({"auth_url": auth_url, "redirect_uri": redirect_uri})
@@ -353,7 +866,6 @@ def google_auth_start():
 @app.route("/auth/google/callback", methods=["GET"])
 def google_auth_callback():
     logging.info(f"Callback received: request.scheme={request.scheme} request.url={request.url} headers_proto={request.headers.get('X-Forwarded-Proto')}")
-    os.environ['OAUTHLIB_RELAX_TOKEN_SCOPE'] = '1'
 
     if "error" in request.args:
         logging.error(f"Google OAuth returned error param: error={request.args.get('error')} description={request.args.get('error_description')}")
@@ -372,12 +884,7 @@ def google_auth_callback():
     redirect_uri = effective_redirect_uri()
     logging.info(f"google_auth_callback redirect_uri={redirect_uri} for user={user_id}")
 
-    flow = Flow.from_client_config(
-        build_client_config(),
-        scopes=["https://www.googleapis.com/auth/drive.file", "openid", "email", "profile"],
-        redirect_uri=redirect_uri,
-        state=state
-    )
+    flow = make_flow(redirect_uri, state=state)
 
     try:
         flow.fetch_token(authorization_response=request.url)
@@ -396,7 +903,7 @@ def google_auth_callback():
         return redirect((FRONTEND_URL or "/") + "?google_link_error=1")
     try:
         with conn.cursor() as cur:
-            cur.execute("UPDATE users SET google_creds_json = %s WHERE id = %s", (creds_to_json(creds), user_id))
+            save_user_creds(cur, user_id, creds)
         conn.commit()
         logging.info(f"Saved Google creds for user {user_id} (refresh_token_present={has_refresh})")
         return redirect((FRONTEND_URL or "/") + "?google_link_success=1")
@@ -404,7 +911,7 @@ def google_auth_callback():
         logging.exception("Saving google creds error")
         return redirect((FRONTEND_URL or "/") + "?google_link_error=1")
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 # ---------------- Notes endpoints ----------------
 @app.route("/save", methods=["POST"])
@@ -424,73 +931,232 @@ def save_text():
         return jsonify({"error": "Database connection failed"}), 500
 
     try:
-        with conn.cursor(cursor_factory=DictCursor) as cur:
-            cur.execute("SELECT google_creds_json FROM users WHERE id = %s", (user_id,))
-            row = cur.fetchone()
-            creds_json = row["google_creds_json"] if row else None
-            drive_file_id = None
-
+        with conn.cursor() as cur:
+            # the write also reports whether Drive is linked, so /save is one round trip
             if filename:
-                cur.execute("SELECT drive_file_id FROM notes WHERE filename = %s AND user_id = %s", (filename, user_id))
+                execute_prepared(cur, "note_update", (content, title, filename, user_id))
                 r = cur.fetchone()
-                existing_drive_id = r["drive_file_id"] if r else None
-
-                if creds_json:
-                    service, refreshed_creds = get_drive_service_from_creds_json(creds_json)
-                    if service:
-                        drive_file_id = upload_or_update_file(service, filename, content, existing_file_id=existing_drive_id)
-                        if refreshed_creds and getattr(refreshed_creds, "refresh_token", None):
-                            cur.execute("UPDATE users SET google_creds_json = %s WHERE id = %s", (creds_to_json(refreshed_creds), user_id))
-
-                cur.execute("""
-                    UPDATE notes
-                    SET filecontent = %s, title = %s, drive_file_id = COALESCE(%s, drive_file_id)
-                    WHERE filename = %s AND user_id = %s
-                """, (content, title, drive_file_id, filename, user_id))
+                if not r:
+                    return jsonify({"error": "Note not found"}), 404
+                drive_file_id, updated_at, drive_linked = r
                 message = "Note updated"
             else:
-                filename = f"note_{int(datetime.now(timezone.utc).timestamp())}_{user_id}.txt"
-                if creds_json:
-                    service, refreshed_creds = get_drive_service_from_creds_json(creds_json)
-                    if service:
-                        drive_file_id = upload_or_update_file(service, filename, content)
-                        if refreshed_creds and getattr(refreshed_creds, "refresh_token", None):
-                            cur.execute("UPDATE users SET google_creds_json = %s WHERE id = %s", (creds_to_json(refreshed_creds), user_id))
-                cur.execute("""
-                    INSERT INTO notes (user_id, filename, filecontent, title, drive_file_id)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (user_id, filename, content, title, drive_file_id))
+                filename = f"note_{time.time_ns()}_{user_id}.txt"
+                execute_prepared(cur, "note_insert", (user_id, filename, content, title))
+                updated_at, drive_linked = cur.fetchone()
+                drive_file_id = None
                 message = "Note saved"
-
         conn.commit()
-        return jsonify({"message": message, "filename": filename, "drive_file_id": drive_file_id}), 200
+        result = {"message": message, "filename": filename, "drive_file_id": drive_file_id, "updated_at": updated_at}
+        # the Drive copy is written by the background worker, after the response
+        if drive_linked:
+            enqueue_drive_upload(user_id, filename, content)
+            result["drive_sync"] = "queued"
+            return jsonify(result), 202
+        return jsonify(result), 200
     except Exception as e:
         logging.error(f"Save note error: {e}")
         return jsonify({"error": "Failed to save note"}), 500
     finally:
-        conn.close()
+        release_db_connection(conn)
+
+@app.route("/save_many", methods=["POST"])
+def save_many():
+    # bulk import: {"notes": [{"title": ..., "content": ...}, ...]}, always creates new notes
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return jsonify({"error": "Authorization required"}), 401
+    data = request.get_json(silent=True)
+    notes = data.get("notes") if isinstance(data, dict) else None
+    if not isinstance(notes, list) or not notes or len(notes) > SAVE_MANY_MAX_NOTES:
+        return jsonify({"error": f"notes must be a list of 1 to {SAVE_MANY_MAX_NOTES} notes"}), 400
+    base = time.time_ns()
+    rows = []
+    for i, note in enumerate(notes):
+        title = note.get("title") if isinstance(note, dict) else None
+        if not isinstance(title, str) or not title.strip():
+            return jsonify({"error": f"Title required (note {i})"}), 400
+        title = title.strip()
+        content = note.get("content", "")
+        if not isinstance(content, str):
+            return jsonify({"error": f"Content must be a string (note {i})"}), 400
+        rows.append((user_id, f"note_{base + i}_{user_id}.txt", content, title))
+
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+
+    try:
+        with conn.cursor() as cur:
+            # one multi-row INSERT, also reporting whether Drive is linked
+            saved = execute_values(cur, """
+                INSERT INTO notes (user_id, filename, filecontent, title) VALUES %s
+                RETURNING filename, updated_at,
+                    (SELECT google_creds_json IS NOT NULL FROM users WHERE id = notes.user_id) AS drive_linked
+            """, rows, page_size=SAVE_MANY_MAX_NOTES, fetch=True)
+        conn.commit()
+        result = {"message": f"{len(saved)} note(s) saved",
+                  "notes": [{"filename": f, "updated_at": u} for f, u, _ in saved]}
+        if saved[0][2]:
+            for _, filename, content, _ in rows:
+                enqueue_drive_upload(user_id, filename, content)
+            result["drive_sync"] = "queued"
+            return jsonify(result), 202
+        return jsonify(result), 200
+    except Exception as e:
+        logging.error(f"Save many notes error: {e}")
+        return jsonify({"error": "Failed to save notes"}), 500
+    finally:
+        release_db_connection(conn)
+
+LIKE_ESCAPE_RE = re.compile(r"([\\%_])")
+
+@lru_cache(maxsize=None)
+def history_query(include_content, cursor_kind, search):
+    # only a handful of shapes exist, so each SQL string is assembled once per process
+    clauses = ["user_id = %s"]
+    if cursor_kind == "keyset":
+        clauses.append("updated_at <= %s AND (updated_at < %s OR filename > %s)")
+    elif cursor_kind == "before":
+        clauses.append("updated_at < %s")
+    if search:
+        # the body is searched in the database so it never has to be sent for filtering
+        clauses.append("(title ILIKE %s OR filecontent ILIKE %s)")
+    where = " AND ".join(clauses)
+    if include_content:
+        return f"""
+            SELECT filename, title, drive_file_id, updated_at, filecontent FROM notes
+            WHERE {where}
+            ORDER BY updated_at DESC, filename LIMIT %s
+        """
+    # the list view is built as JSON by Postgres, updated_at spelled the way orjson writes it
+    return f"""
+        SELECT coalesce(json_agg(n ORDER BY n.updated_at DESC, n.filename), '[]')::text
+        FROM (
+            SELECT filename, title, drive_file_id,
+                   to_char(updated_at AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US"+00:00"') AS updated_at,
+                   left(filecontent, {HISTORY_PREVIEW_CHARS}) AS preview
+            FROM notes
+            WHERE {where}
+            ORDER BY notes.updated_at DESC, notes.filename LIMIT %s
+        ) n
+    """
 
 @app.route("/history", methods=["GET"])
 def get_history():
     user_id = get_user_id_from_request(request)
     if not user_id:
         return jsonify({"error": "Authorization required"}), 401
-    conn = get_db_connection()
+    # keyset pagination: ?limit=N&before=<updated_at>&before_filename=<filename>
+    try:
+        limit = min(max(int(request.args.get("limit", HISTORY_DEFAULT_LIMIT)), 1), HISTORY_MAX_LIMIT)
+        before = request.args.get("before")
+        before = datetime.fromisoformat(before) if before else None
+    except ValueError:
+        return jsonify({"error": "Invalid limit or before parameter"}), 400
+    before_filename = request.args.get("before_filename")
+    search = request.args.get("q", "").strip()
+    # note bodies are only sent when asked for; the list view gets a short preview instead
+    include_content = request.args.get("include_content") == "1"
+    params = [user_id]
+    cursor_kind = None
+    if before and before_filename is not None:
+        cursor_kind = "keyset"
+        params += [before, before, before_filename]
+    elif before:
+        cursor_kind = "before"
+        params.append(before)
+    if search:
+        pattern = "%" + LIKE_ESCAPE_RE.sub(r"\\\1", search) + "%"
+        params += [pattern, pattern]
+    params.append(limit)
+    query = history_query(include_content, cursor_kind, bool(search))
+    conn = get_db_connection(autocommit=not include_content)
     if not conn:
         return jsonify({"error": "Database connection failed"}), 500
+    stream_cur = None
+    streaming = False
     try:
-        with conn.cursor(cursor_factory=DictCursor) as cur:
-            cur.execute("""
-                SELECT filename, filecontent, title, drive_file_id, updated_at
-                FROM notes WHERE user_id = %s ORDER BY updated_at DESC
-            """, (user_id,))
-            notes = [dict(r) for r in cur.fetchall()]
-        return jsonify(notes), 200
+        # ETag over the user's notes version and the query
+        with conn.cursor() as cur:
+            execute_prepared(cur, "notes_version", (user_id,))
+            version = cur.fetchone()[0]
+        etag = hashlib.sha1(f"{user_id}:{version}:{request.query_string.decode()}".encode()).hexdigest()
+        if request.if_none_match.contains(etag):
+            resp = Response(status=304)
+        elif include_content and request.method == "HEAD":
+            # the body is never sent for HEAD, so no server-side cursor is opened
+            resp = Response(mimetype="application/json")
+        elif include_content:
+            # bodies can be large: read them through a server-side cursor and stream the array out
+            stream_cur = conn.cursor(name="history_cur", cursor_factory=RealDictCursor)
+            stream_cur.itersize = HISTORY_STREAM_ITERSIZE
+            stream_cur.execute(query, params)
+            resp = Response(stream_history(stream_cur), mimetype="application/json")
+        else:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                resp = Response(cur.fetchone()[0], mimetype="application/json")
+        # browsers keep the body and revalidate it with If-None-Match on the next fetch
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "private, no-cache"
+        resp.vary.add("Authorization")
+        if stream_cur is not None:
+            resp.call_on_close(history_stream_closer(conn, stream_cur))
+            streaming = True
+        return resp
     except Exception as e:
         logging.error(f"Get history error: {e}")
         return jsonify({"error": "Failed to retrieve history"}), 500
     finally:
-        conn.close()
+        if not streaming:
+            release_db_connection(conn)
+
+def stream_history(cur):
+    try:
+        # chunks go out as the bytes orjson produces, with no str round trip
+        yield b"["
+        for i, row in enumerate(cur):
+            yield (b"," if i else b"") + orjson.dumps(row, default=app.json.default)
+        yield b"]"
+    except Exception:
+        logging.exception("Stream history error")
+
+def history_stream_closer(conn, cur):
+    # the server calls this once it is done with the response, even if the body was never iterated
+    closed = []
+    def close():
+        if closed:
+            return
+        closed.append(True)
+        try:
+            cur.close()
+        except Exception:
+            logging.exception("Closing history cursor failed")
+        finally:
+            release_db_connection(conn)
+    return close
+
+@app.route("/note/<filename>", methods=["GET"])
+def get_note(filename):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return jsonify({"error": "Authorization required"}), 401
+    conn = get_db_connection(autocommit=True)
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            execute_prepared(cur, "note_by_filename", (user_id, filename))
+            note = cur.fetchone()
+        if not note:
+            return jsonify({"error": "Note not found"}), 404
+        return jsonify(note), 200
+    except Exception as e:
+        logging.error(f"Get note error: {e}")
+        return jsonify({"error": "Failed to retrieve note"}), 500
+    finally:
+        release_db_connection(conn)
 
 @app.route("/delete", methods=["POST"])
 def delete_notes():
@@ -499,7 +1165,7 @@ def delete_notes():
         return jsonify({"error": "Authorization required"}), 401
     data = request.get_json() or {}
     filenames = data.get("filenames")
-    if not isinstance(filenames, list) or not filenames:
+    if not isinstance(filenames, list) or not filenames or not all(isinstance(f, str) for f in filenames):
         return jsonify({"error": "filenames must be a non-empty list"}), 400
 
     conn = get_db_connection()
@@ -507,30 +1173,23 @@ def delete_notes():
         return jsonify({"error": "Database connection failed"}), 500
 
     try:
-        with conn.cursor(cursor_factory=DictCursor) as cur:
-            cur.execute("SELECT filename, drive_file_id FROM notes WHERE user_id = %s AND filename = ANY(%s)", (user_id, filenames))
-            items = cur.fetchall()
-            cur.execute("SELECT google_creds_json FROM users WHERE id = %s", (user_id,))
-            row = cur.fetchone()
-            creds_json = row["google_creds_json"] if row else None
-            service = None
-            if creds_json:
-                service, refreshed_creds = get_drive_service_from_creds_json(creds_json)
-                if refreshed_creds and getattr(refreshed_creds, "refresh_token", None):
-                    cur.execute("UPDATE users SET google_creds_json = %s WHERE id = %s", (creds_to_json(refreshed_creds), user_id))
-            deleted_count = 0
-            for it in items:
-                if it["drive_file_id"] and service:
-                    if delete_drive_file(service, it["drive_file_id"]):
-                        deleted_count += 1
-            cur.execute("DELETE FROM notes WHERE user_id = %s AND filename = ANY(%s)", (user_id, filenames))
+        with conn.cursor() as cur:
+            execute_prepared(cur, "notes_delete", (user_id, filenames))
+            drive_ids, creds_json = cur.fetchone()
         conn.commit()
-        return jsonify({"message": f"{len(filenames)} note(s) deleted; {deleted_count} Drive file(s) removed."}), 200
     except Exception as e:
         logging.error(f"Delete notes error: {e}")
         return jsonify({"error": "Failed to delete notes"}), 500
     finally:
-        conn.close()
+        release_db_connection(conn)
+    # the rows are gone and their locks released before Drive is called
+    if drive_ids:
+        try:
+            delete_notes_from_drive(user_id, drive_ids, creds_json)
+        except Exception:
+            logging.exception("Drive delete error")
+    # the client only needs the status; it reloads the list itself
+    return "", 204
 
 # ---------------- Health endpoint ----------------
 @app.route("/health", methods=["GET"])
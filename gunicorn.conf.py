@@ -0,0 +1,30 @@
+import os
+import sys
+import subprocess
+
+# ---- gunicorn settings (picked up automatically by `gunicorn app:app`) ----
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+# the app mostly waits on Postgres and Google Drive
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", "1000"))
+# gthread only; keep at or below PG_POOL_MAX
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+# keep the worker heartbeat file off the (possibly slow) container filesystem
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+def on_starting(server):
+    # run init-db in a child process so the master never imports the app; a failure stops startup
+    if os.environ.get("INIT_DB_ON_START", "1") == "1":
+        subprocess.run([sys.executable, "-m", "flask", "--app", "app", "init-db"], check=True)
+
+def post_worker_init(worker):
+    # psycopg2 is a C extension, so gevent needs psycogreen to make it cooperative
+    if worker_class == "gevent":
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    # build the dummy login hash before the first request; CLI runs never get here
+    from app import get_dummy_password_hash
+    get_dummy_password_hash()
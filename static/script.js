@@ -3,6 +3,8 @@
 
     // --- Configuration & State ---
     const API_BASE_URL = "https://savetext-0pk6.onrender.com";
+    const HISTORY_PAGE_SIZE = 200;
+    const SEARCH_DEBOUNCE_MS = 300;
 
     const state = {
         token: localStorage.getItem("token"),
@@ -11,6 +13,8 @@
         notesCache: [],
         selectedNotes: new Set(),
         messageTimeout: null,
+        searchTimeout: null,
+        historyRequestId: 0,
         userEmail: null,
         driveLinked: false,
         pinnedNotes: new Set(JSON.parse(localStorage.getItem("pinnedNotes") || "[]"))
@@ -238,13 +242,30 @@
     }
 
     async function fetchHistory() {
+        // a newer walk (e.g. the next debounced search) supersedes this one and drops its results
+        const requestId = ++state.historyRequestId;
+        const isStale = () => requestId !== state.historyRequestId;
         showLoader(true);
         UI.displays.historyStatus.style.display = "none";
         try {
-            const data = await apiRequest("/history");
-            state.notesCache = data || [];
-            renderHistory(UI.inputs.searchNotes.value);
+            // walk /history's pages, keyed on the last note's (updated_at, filename)
+            const searchTerm = UI.inputs.searchNotes.value.trim();
+            const notes = [];
+            let last = null;
+            while (true) {
+                let endpoint = `/history?limit=${HISTORY_PAGE_SIZE}`;
+                if (searchTerm) endpoint += `&q=${encodeURIComponent(searchTerm)}`;
+                if (last) endpoint += `&before=${encodeURIComponent(last.updated_at)}&before_filename=${encodeURIComponent(last.filename)}`;
+                const page = await apiRequest(endpoint) || [];
+                if (isStale()) return;
+                notes.push(...page);
+                if (page.length < HISTORY_PAGE_SIZE) break;
+                last = page[page.length - 1];
+            }
+            state.notesCache = notes;
+            renderHistory();
         } catch (error) {
+            if (isStale()) return;
             showMessage(UI.displays.historyStatus, error.message || "Failed to load history", "error");
         } finally {
             showLoader(false);
@@ -269,21 +290,14 @@
         }
     }
 
-    function renderHistory(searchTerm = "") {
+    function renderHistory() {
         const list = UI.displays.historyList;
-        const lowerCaseSearchTerm = searchTerm.toLowerCase();
-        const notesToRender = state.notesCache.filter(note =>
-            (note.title && note.title.toLowerCase().includes(lowerCaseSearchTerm)) ||
-            (note.filecontent && note.filecontent.toLowerCase().includes(lowerCaseSearchTerm))
-        );
-
-        notesToRender.sort((a, b) => {
-            const aIsPinned = state.pinnedNotes.has(a.filename);
-            const bIsPinned = state.pinnedNotes.has(b.filename);
-            if (aIsPinned && !bIsPinned) return -1;
-            if (!aIsPinned && bIsPinned) return 1;
-            return new Date(b.updated_at) - new Date(a.updated_at);
-        });
+        // /history already returns notes newest first; only pinned notes need moving to the top
+        const isPinned = note => state.pinnedNotes.has(note.filename);
+        const notesToRender = [
+            ...state.notesCache.filter(isPinned),
+            ...state.notesCache.filter(note => !isPinned(note))
+        ];
 
         if (notesToRender.length === 0) {
             list.innerHTML = `<p class="message">No notes found.</p>`;
@@ -303,6 +317,7 @@
                     <input type="checkbox" class="note-select" data-filename="${escapeHTML(note.filename)}" ${isSelected ? 'checked' : ''} aria-label="Select note">
                     <div class="note-text-content">
                         <h3 class="note-title">${escapeHTML(note.title)}</h3>
+                        ${note.preview ? `<p class="note-preview">${escapeHTML(note.preview)}</p>` : ''}
                         <div class="note-meta">
                             ${driveIcon}
                             <span class="note-date">${new Date(note.updated_at).toLocaleString()}</span>
@@ -340,8 +355,25 @@
         }
     }
 
-    function handleViewNote(filename) {
-        const note = state.notesCache.find(n => n.filename === filename);
+    // The history list only carries previews; fetch a note's body the first time it's needed.
+    async function loadNoteContent(note) {
+        if (note.filecontent !== undefined) return note;
+        showLoader(true);
+        try {
+            const full = await apiRequest(`/note/${encodeURIComponent(note.filename)}`);
+            note.filecontent = full.filecontent || "";
+            return note;
+        } catch (error) {
+            showMessage(UI.displays.historyStatus, error.message || "Failed to load note", "error");
+            return null;
+        } finally {
+            showLoader(false);
+        }
+    }
+
+    async function handleViewNote(filename) {
+        const cached = state.notesCache.find(n => n.filename === filename);
+        const note = cached && await loadNoteContent(cached);
         if (!note) return;
         UI.displays.viewNoteTitle.textContent = note.title;
         UI.displays.viewNoteContent.textContent = note.filecontent;
@@ -354,8 +386,9 @@
         UI.buttons.closeViewModal.focus();
     }
 
-    function handleCopyNote(button, filename) {
-        const note = state.notesCache.find(n => n.filename === filename);
+    async function handleCopyNote(button, filename) {
+        const cached = state.notesCache.find(n => n.filename === filename);
+        const note = cached && await loadNoteContent(cached);
         if (!note || !note.filecontent) return;
 
         navigator.clipboard.writeText(note.filecontent).then(() => {
@@ -375,10 +408,12 @@
             state.pinnedNotes.add(filename);
         }
         localStorage.setItem("pinnedNotes", JSON.stringify([...state.pinnedNotes]));
-        renderHistory(UI.inputs.searchNotes.value);
+        renderHistory();
     }
 
-    function editNote(note) {
+    async function editNote(cached) {
+        const note = await loadNoteContent(cached);
+        if (!note) return;
         state.editingFilename = note.filename;
         UI.inputs.noteTitle.value = note.title;
         UI.inputs.textInput.value = note.filecontent;
@@ -541,7 +576,10 @@
         UI.buttons.cancelEdit.addEventListener("click", resetEditor);
         UI.displays.historyList.addEventListener("click", handleHistoryListClick);
 
-        UI.inputs.searchNotes.addEventListener("input", (e) => renderHistory(e.target.value));
+        UI.inputs.searchNotes.addEventListener("input", () => {
+            clearTimeout(state.searchTimeout);
+            state.searchTimeout = setTimeout(fetchHistory, SEARCH_DEBOUNCE_MS);
+        });
         UI.inputs.selectAllNotes.addEventListener("change", toggleSelectAll);
         UI.buttons.deleteSelected.addEventListener("click", () => handleDeleteNote([...state.selectedNotes]));
         UI.buttons.connectDrive.addEventListener("click", (e) => { e.preventDefault(); startDriveConnect(); });
@@ -0,0 +1,5 @@
+import os
+import sys
+
+os.environ.setdefault("JWT_SECRET", "test-jwt-secret-0123456789abcdef0123")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
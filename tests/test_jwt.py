@@ -0,0 +1,78 @@
+import json
+import hmac
+import time
+import hashlib
+
+import pytest
+
+import app
+
+
+def sign(payload, header=None):
+    # builds an HS256 token with the app's key, but with any header/payload we like
+    if header is None:
+        header_b64 = app.JWT_HEADER_B64
+    else:
+        header_b64 = app.b64url_encode(json.dumps(header).encode())
+    signing_input = header_b64 + b"." + app.b64url_encode(json.dumps(payload).encode())
+    sig = hmac.new(app.JWT_KEY, signing_input, hashlib.sha256).digest()
+    return (signing_input + b"." + app.b64url_encode(sig)).decode()
+
+
+def test_round_trip():
+    token = app.create_token(42)
+    payload = app.verify_token(token)
+    assert payload["sub"] == "42"
+    assert payload["exp"] - payload["iat"] == app.JWT_EXP_SECONDS
+    assert app.decode_token(token) == "42"
+
+
+def test_expired_token_rejected():
+    now = int(time.time())
+    assert app.verify_token(sign({"sub": "1", "iat": now - 100, "exp": now - 1})) is None
+
+
+@pytest.mark.parametrize("exp", [None, "9999999999", [9999999999]])
+def test_missing_or_non_numeric_exp_rejected(exp):
+    payload = {"sub": "1", "iat": int(time.time())}
+    if exp is not None:
+        payload["exp"] = exp
+    assert app.verify_token(sign(payload)) is None
+
+
+def test_tampered_payload_rejected():
+    header, _, sig = app.create_token(1).split(".")
+    now = int(time.time())
+    forged = app.b64url_encode(json.dumps({"sub": "2", "iat": now, "exp": now + 60}).encode()).decode()
+    assert app.verify_token(f"{header}.{forged}.{sig}") is None
+
+
+def test_tampered_signature_rejected():
+    header, payload, sig = app.create_token(1).split(".")
+    bad_sig = app.b64url_encode(bytes(b ^ 1 for b in app.b64url_decode(sig.encode()))).decode()
+    assert app.verify_token(f"{header}.{payload}.{bad_sig}") is None
+    assert app.verify_token(f"{header}.{payload}.") is None
+
+
+@pytest.mark.parametrize("header", [
+    {"alg": "HS256", "typ": "JWT"},  # json.dumps default separators add spaces
+    {"typ": "JWT", "alg": "HS256"},
+    {"alg": "none", "typ": "JWT"},
+])
+def test_non_canonical_header_rejected(header):
+    now = int(time.time())
+    assert app.verify_token(sign({"sub": "1", "iat": now, "exp": now + 60}, header=header)) is None
+
+
+def test_malformed_tokens_rejected():
+    for token in ("", "abc", "a.b", "a.b.c", app.create_token(1) + "x.y"):
+        assert app.verify_token(token) is None
+
+
+def test_compatible_with_pyjwt():
+    jwt = pytest.importorskip("jwt")
+    now = int(time.time())
+    issued = jwt.encode({"sub": "7", "iat": now, "exp": now + 60}, app.JWT_SECRET, algorithm="HS256")
+    assert app.decode_token(issued) == "7"
+    decoded = jwt.decode(app.create_token(7), app.JWT_SECRET, algorithms=["HS256"])
+    assert decoded["sub"] == "7"
@@ -0,0 +1,52 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # validation failures must answer before a DB connection is taken
+    monkeypatch.setattr(app, "get_db_connection", lambda *a, **k: None)
+    return app.app.test_client()
+
+
+def post(client, body, token=True):
+    headers = {"Authorization": f"Bearer {app.create_token(1)}"} if token else {}
+    return client.post("/save_many", json=body, headers=headers)
+
+
+def test_requires_auth(client):
+    assert post(client, {"notes": [{"title": "a"}]}, token=False).status_code == 401
+
+
+@pytest.mark.parametrize("body", [
+    {},
+    {"notes": []},
+    {"notes": "abc"},
+    {"notes": [{"title": "a"}] * (app.SAVE_MANY_MAX_NOTES + 1)},
+    [{"title": "a"}],
+])
+def test_rejects_bad_notes_list(client, body):
+    resp = post(client, body)
+    assert resp.status_code == 400
+    assert resp.get_json()["error"].startswith("notes must be a list")
+
+
+@pytest.mark.parametrize("note", [{}, {"title": 5}, {"title": "   "}, {"title": None}, "abc"])
+def test_rejects_bad_title_with_index(client, note):
+    resp = post(client, {"notes": [{"title": "ok"}, note]})
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == "Title required (note 1)"
+
+
+@pytest.mark.parametrize("content", [5, None, ["a"], {"a": 1}])
+def test_rejects_non_string_content_with_index(client, content):
+    resp = post(client, {"notes": [{"title": "a", "content": content}]})
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == "Content must be a string (note 0)"
+
+
+def test_valid_notes_reach_the_database(client):
+    resp = post(client, {"notes": [{"title": "a"}, {"title": "b", "content": "text"}]})
+    assert resp.status_code == 500
+    assert resp.get_json()["error"] == "Database connection failed"